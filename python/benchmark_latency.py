@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Compare socket profiles on request/response latency and bulk throughput.
+
+Each round trip is sent the way our commands are: a short header write
+followed by a short payload write, then the reply is awaited. This
+write-write-read pattern is where Nagle's algorithm and delayed ACKs add
+latency, so the default profile and low_latency differ clearly.
+
+    python benchmark_latency.py --iterations 500 --bulk-mb 64
+    python benchmark_latency.py --host 127.0.0.1 --port 2347  # via iproxy
+
+With --host the commands go to a running device (or device_simulator.py),
+whose "Message received: ..." replies also end in the payload's newline.
+"""
+
+import argparse
+import socket
+import statistics
+import threading
+import time
+
+from socket_profiles import (
+    PROFILES,
+    apply_profile,
+    corked,
+    get_profile,
+    rearm_quickack,
+)
+
+CHUNK = 64 * 1024
+
+
+def _recv_line(sock, buffer, profile):
+    while b"\n" not in buffer:
+        data = sock.recv(4096)
+        rearm_quickack(sock, profile)
+        if not data:
+            raise ConnectionError("connection closed")
+        buffer += data
+    line, _, rest = buffer.partition(b"\n")
+    return line, rest
+
+
+def _serve_client(conn, profile):
+    """Answer each command line with a two-part reply; count bulk bytes."""
+    buffer = b""
+    with conn:
+        try:
+            while True:
+                line, buffer = _recv_line(conn, buffer, profile)
+                if line.startswith(b"bulk:"):
+                    remaining = int(line[5:]) - len(buffer)
+                    buffer = b""
+                    while remaining > 0:
+                        data = conn.recv(min(CHUNK, remaining))
+                        if not data:
+                            return
+                        remaining -= len(data)
+                    conn.sendall(b"done\n")
+                else:
+                    conn.sendall(b"ok:")
+                    conn.sendall(line + b"\n")
+        except (ConnectionError, OSError):
+            pass
+
+
+def start_echo_server(profile):
+    """Start a local server using the `profile` dict and return its port."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    apply_profile(server, profile)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def accept_loop():
+        while True:
+            conn, _ = server.accept()
+            apply_profile(conn, profile)
+            threading.Thread(
+                target=_serve_client, args=(conn, profile), daemon=True
+            ).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def measure_latency(host, port, profile, iterations):
+    """Return round-trip times in milliseconds for header+payload commands."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    apply_profile(sock, profile)
+    sock.connect((host, port))
+    buffer = b""
+    samples = []
+    with sock:
+        for i in range(iterations):
+            start = time.perf_counter()
+            sock.sendall(b"cmd:")
+            sock.sendall(f"{i}\n".encode("utf-8"))
+            _, buffer = _recv_line(sock, buffer, profile)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure_throughput(host, port, profile, megabytes):
+    """Return MB/s for a single bulk transfer sent in corked batches."""
+    total = megabytes * 1024 * 1024
+    payload = b"B" * CHUNK
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    apply_profile(sock, profile)
+    sock.connect((host, port))
+    with sock:
+        start = time.perf_counter()
+        sock.sendall(f"bulk:{total}\n".encode("utf-8"))
+        sent = 0
+        while sent < total:
+            with corked(sock, profile):
+                for _ in range(16):
+                    size = min(CHUNK, total - sent)
+                    if size <= 0:
+                        break
+                    sock.sendall(payload[:size])
+                    sent += size
+        _recv_line(sock, b"", profile)
+        elapsed = time.perf_counter() - start
+    return megabytes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--profiles",
+        default=",".join(PROFILES),
+        help="Comma-separated socket profiles to compare",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--bulk-mb", type=int, default=0, help="Bulk transfer size")
+    parser.add_argument("--host", help="Benchmark an existing server instead")
+    parser.add_argument("--port", type=int, default=2347)
+    args = parser.parse_args()
+    if args.host and args.bulk_mb:
+        parser.error("--bulk-mb needs the built-in server; devices echo everything")
+    names = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    try:
+        profiles = {name: get_profile(name) for name in names}
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(
+        f"{'profile':<12} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        + ("   bulk MB/s" if args.bulk_mb else "")
+    )
+    for name, profile in profiles.items():
+        if args.host:
+            host, port = args.host, args.port
+        else:
+            host, port = "127.0.0.1", start_echo_server(profile)
+
+        samples = sorted(measure_latency(host, port, profile, args.iterations))
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        line = (
+            f"{name:<12} {statistics.mean(samples):>8.3f}"
+            f" {statistics.median(samples):>8.3f} {p99:>8.3f} {samples[-1]:>8.3f}"
+        )
+        if args.bulk_mb:
+            throughput = measure_throughput(host, port, profile, args.bulk_mb)
+            line += f"   {throughput:>10.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,42 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
+import queue
+import socket
+import stat
 import subprocess
+import sys
+import threading
 import time
 import json
 from datetime import datetime
 import re
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from net_tracker import NetworkTracker, get_tracker
+
+
+def is_reported_interface(name):
+    """Skip the loopback interface in both the dump and the event stream"""
+    return name != "lo"
+
 
 def get_network_interfaces():
     """Get list of current network interfaces, excluding Apple interfaces"""
+    if NetworkTracker.is_supported():
+        # Read /sys/class/net in-process; rescanned only after rtnetlink events
+        interfaces = get_tracker().get_interfaces()
+        return "\n".join(
+            f"{name}: {info['address']} ({info['operstate']})"
+            for name, info in sorted(interfaces.items())
+            if is_reported_interface(name)
+        )
+
     try:
         result = subprocess.run(
             ["networksetup", "-listallhardwareports"], capture_output=True, text=True
@@ -34,6 +62,103 @@ def get_network_interfaces():
         return ""
 
 
+def get_network_interface_table():
+    """Interface listing attached to USB network devices"""
+    if NetworkTracker.is_supported():
+        # The tracker's cached table, instead of forking networksetup each poll
+        return get_network_interfaces()
+    result = subprocess.run(
+        ["networksetup", "-listallhardwareports"], capture_output=True, text=True
+    )
+    return result.stdout
+
+
+def is_reported_connection(key, state):
+    """Skip loopback traffic and transient states, as the netstat filter does"""
+    _, local, remote = key
+    if state not in ("ESTABLISHED", "LISTEN"):
+        return False
+    return local[0] not in ("127.0.0.1", "::1") and remote[0] not in (
+        "127.0.0.1",
+        "::1",
+    )
+
+
+def format_connection(key, state):
+    proto, local, remote = key
+    return f"{proto} {local[0]}.{local[1]} {remote[0]}.{remote[1]} {state}"
+
+
+# Connections last reported by get_network_changes, with their state
+_reported_connections = {}
+
+
+def get_network_changes():
+    """Return network events since the previous call as (event, kind, key, info)
+
+    Interfaces are only rescanned after rtnetlink events, but the connection
+    table is re-read and diffed in full on every call, so that part grows
+    with the number of connections. Returns [] where /proc is unavailable.
+    """
+    if not NetworkTracker.is_supported():
+        return []
+
+    tracker = get_tracker()
+    events = []
+    interfaces = tracker.poll_interfaces()
+    for delta_key, event in (
+        ("added", "add"),
+        ("removed", "remove"),
+        ("changed", "change"),
+    ):
+        for name, info in interfaces[delta_key].items():
+            if is_reported_interface(name):
+                events.append((event, "interface", name, info))
+
+    connections = tracker.poll_connections()
+    updated = {**connections["added"], **connections["changed"]}
+    for key, state in updated.items():
+        if is_reported_connection(key, state):
+            event = "change" if key in _reported_connections else "add"
+            _reported_connections[key] = state
+            events.append((event, "connection", key, state))
+        elif key in _reported_connections:
+            # Left ESTABLISHED/LISTEN, e.g. into TIME_WAIT
+            del _reported_connections[key]
+            events.append(("remove", "connection", key, state))
+    for key, state in connections["removed"].items():
+        if _reported_connections.pop(key, None) is not None:
+            events.append(("remove", "connection", key, state))
+    return events
+
+
+def network_event_record(event, kind, key, info):
+    """JSON-serialisable record for a network event"""
+    record = {"event": event, "time": time.time()}
+    if kind == "interface":
+        record["interface"] = dict(info, name=key)
+    else:
+        proto, local, remote = key
+        record["connection"] = {
+            "proto": proto,
+            "local": f"{local[0]}:{local[1]}",
+            "remote": f"{remote[0]}:{remote[1]}",
+            "state": info,
+        }
+    return record
+
+
+def print_network_events(events):
+    """Print network events as human-readable text"""
+    labels = {"add": "added", "remove": "removed", "change": "changed"}
+    for event, kind, key, info in events:
+        if kind == "interface":
+            details = f"{key}: {info.get('ipv4') or '-'} ({info.get('operstate')})"
+        else:
+            details = format_connection(key, info)
+        print(f"[{datetime.now()}] {kind.capitalize()} {labels[event]}: {details}")
+
+
 def get_usb_devices():
     """Get list of all USB devices with their details"""
     try:
@@ -70,6 +195,15 @@ def get_usb_devices():
 
 def get_network_connections():
     """Get active network connections, excluding local and Apple services"""
+    if NetworkTracker.is_supported():
+        # Parse /proc/net/tcp{,6} in-process instead of forking netstat
+        connections = get_tracker().get_connections()
+        return "\n".join(
+            format_connection(key, state)
+            for key, state in sorted(connections.items())
+            if is_reported_connection(key, state)
+        )
+
     try:
         result = subprocess.run(["netstat", "-an"], capture_output=True, text=True)
         connections = []
@@ -168,16 +302,15 @@ def get_detailed_usb_info():
         all_devices = devices + disk_devices
 
         # Get additional network interface information for USB network devices
-        network_result = subprocess.run(
-            ["networksetup", "-listallhardwareports"], capture_output=True, text=True
-        )
-
+        network_info = None
         for device in all_devices:
             if (
                 "network" in device["name"].lower()
                 or "ethernet" in device["name"].lower()
             ):
-                device["network_info"] = network_result.stdout
+                if network_info is None:
+                    network_info = get_network_interface_table()
+                device["network_info"] = network_info
 
         return all_devices
 
@@ -216,41 +349,305 @@ def format_device_info(device):
     return "\n".join(info)
 
 
-def monitor_usb_devices():
-    print("Starting USB device monitoring...")
-    print("Press Ctrl+C to stop")
-    print("\nMonitoring for USB device changes...")
+def device_key(device):
+    """Stable identity for a device so attribute updates show up as changes"""
+    if device.get("serial"):
+        return f"serial:{device['serial']}"
+    if device.get("device"):
+        return f"path:{device['device']}"
+    return "usb:{}:{}:{}:{}".format(
+        device.get("name", "Unknown"),
+        device.get("vendor_id", ""),
+        device.get("product_id", ""),
+        device.get("address", ""),
+    )
+
+
+def diff_devices(previous, current):
+    """Return (event, key, device) tuples for adds, removals and changes"""
+    events = []
+    for key, device in current.items():
+        if key not in previous:
+            events.append(("add", key, device))
+        elif previous[key] != device:
+            events.append(("change", key, device))
+    for key, device in previous.items():
+        if key not in current:
+            events.append(("remove", key, device))
+    return events
+
+
+def device_event_record(event, key, device):
+    """Record for a device event, as sent to subscribers and written as JSON Lines"""
+    return {"event": event, "time": time.time(), "key": key, "device": device}
+
+
+def encode_record(record, encoding="json"):
+    """Encode a record as one JSON line or one msgpack map"""
+    if encoding == "msgpack":
+        return msgpack.packb(record)
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def write_jsonl(records):
+    """Write records to stdout as JSON Lines"""
+    for record in records:
+        sys.stdout.write(encode_record(record).decode("utf-8"))
+    sys.stdout.flush()
+
+
+def remove_socket_file(path):
+    """Remove a stale Unix socket at `path`, refusing to delete anything else"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    os.unlink(path)
+
+
+class Subscriber:
+    """A connected event consumer with its own bounded outbound queue"""
+
+    def __init__(self, conn, queue_size):
+        self.conn = conn
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        # Wake the writer thread if it is waiting on an empty queue
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class DeviceEventPublisher:
+    """Publish device add/remove/change events to Unix socket subscribers.
+
+    Every subscriber first receives a `snapshot` record whose `devices` maps
+    each device key to its device, then one record per event carrying the
+    same `key`. Records are JSON Lines or, with
+    `encoding="msgpack"`, a stream of msgpack maps. A subscriber whose queue
+    fills up is disconnected rather than stalling the monitor; it can
+    reconnect and resync from a fresh snapshot.
+    """
+
+    def __init__(self, path, encoding="json", queue_size=256):
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("msgpack encoding requires the msgpack package")
+        if queue_size < 1:
+            # queue.Queue treats a size of 0 or less as unbounded
+            raise ValueError(f"queue_size must be at least 1, got {queue_size}")
+        self.path = path
+        self.encoding = encoding
+        self.queue_size = queue_size
+        self.devices = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server_socket = None
+        self.is_running = False
+
+    def start(self):
+        """Bind the Unix socket and start accepting subscribers"""
+        remove_socket_file(self.path)
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(self.path)
+        self.server_socket.listen()
+        self.is_running = True
+        accept_thread = threading.Thread(target=self._accept_loop)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+    def encode(self, record):
+        return encode_record(record, self.encoding)
+
+    def _accept_loop(self):
+        while self.is_running:
+            try:
+                conn, _ = self.server_socket.accept()
+            except OSError:
+                break
+            subscriber = Subscriber(conn, self.queue_size)
+            # Snapshot and registration happen together so no event is missed
+            with self.lock:
+                subscriber.queue.put_nowait(
+                    self.encode(
+                        {
+                            "event": "snapshot",
+                            "time": time.time(),
+                            "devices": dict(self.devices),
+                        }
+                    )
+                )
+                self.subscribers.append(subscriber)
+            writer = threading.Thread(target=self._writer_loop, args=(subscriber,))
+            writer.daemon = True
+            writer.start()
+
+    def _writer_loop(self, subscriber):
+        while not subscriber.closed:
+            data = subscriber.queue.get()
+            if data is None:
+                break
+            try:
+                subscriber.conn.sendall(data)
+            except OSError:
+                break
+        self._remove(subscriber)
+
+    def _remove(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.close()
+
+    def publish(self, event, key, device):
+        """Record a device event and queue it for every subscriber"""
+        with self.lock:
+            if event == "remove":
+                self.devices.pop(key, None)
+            else:
+                self.devices[key] = device
+            data = self.encode(device_event_record(event, key, device))
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(data)
+            except queue.Full:
+                # stderr, since stdout may be the JSON Lines stream
+                print(
+                    f"Subscriber too slow, disconnecting (queue of {self.queue_size})",
+                    file=sys.stderr,
+                )
+                self._remove(subscriber)
+
+    def close(self):
+        self.is_running = False
+        if self.server_socket:
+            self.server_socket.close()
+            self.server_socket = None
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            self._remove(subscriber)
+        remove_socket_file(self.path)
+
+
+def print_device_events(events):
+    """Print device events as human-readable text"""
+    for event, _, device in events:
+        if event == "remove":
+            print(f"\n[{datetime.now()}] Device removed: {device.get('name', 'Unknown')}")
+            print(f"Type: {device.get('type', 'Unknown')}")
+        else:
+            label = "New device detected" if event == "add" else "Device changed"
+            print(f"\n[{datetime.now()}] {label}:")
+            print("\n" + format_device_info(device))
+        print("-" * 80)
+
+
+def monitor_usb_devices(publisher=None, output="text"):
+    """Poll for USB device and network changes and report them.
+
+    `output` is "text" for the human-readable report, "jsonl" for one JSON
+    record per event on stdout, or "none". Device events are also sent to
+    `publisher` if one is given. Network changes come from the tracker's
+    deltas and are only reported where /proc is available.
+    """
+    if output == "text":
+        print("Starting USB device monitoring...")
+        print("Press Ctrl+C to stop")
+        print("\nMonitoring for USB device changes...")
 
     # Initial state
-    prev_devices = get_detailed_usb_info()
+    prev_devices = {device_key(d): d for d in get_detailed_usb_info()}
+    get_network_changes()  # Baseline; only later changes are reported
+    if publisher:
+        for key, device in prev_devices.items():
+            publisher.publish("add", key, device)
 
     try:
         while True:
-            current_devices = get_detailed_usb_info()
-
-            # Check for new devices
-            new_devices = [d for d in current_devices if d not in prev_devices]
-            if new_devices:
-                print(f"\n[{datetime.now()}] New device(s) detected:")
-                for device in new_devices:
-                    print("\n" + format_device_info(device))
-                    print("-" * 80)
-
-            # Check for removed devices
-            removed_devices = [d for d in prev_devices if d not in current_devices]
-            if removed_devices:
-                print(f"\n[{datetime.now()}] Device(s) removed:")
-                for device in removed_devices:
-                    print(f"\nDevice removed: {device.get('name', 'Unknown')}")
-                    print(f"Type: {device.get('type', 'Unknown')}")
-                    print("-" * 80)
+            current_devices = {device_key(d): d for d in get_detailed_usb_info()}
+            events = diff_devices(prev_devices, current_devices)
+
+            if events:
+                if output == "text":
+                    print_device_events(events)
+                elif output == "jsonl":
+                    write_jsonl(device_event_record(*e) for e in events)
+                if publisher:
+                    for event, key, device in events:
+                        publisher.publish(event, key, device)
+
+            network_events = get_network_changes()
+            if network_events:
+                if output == "text":
+                    print_network_events(network_events)
+                elif output == "jsonl":
+                    write_jsonl(network_event_record(*e) for e in network_events)
 
             prev_devices = current_devices
             time.sleep(1)  # Check every second
 
     except KeyboardInterrupt:
-        print("\nMonitoring stopped by user")
+        if output == "text":
+            print("\nMonitoring stopped by user")
+
+
+def positive_int(value):
+    """argparse type for options that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor USB device changes")
+    parser.add_argument("--socket", help="Unix socket path to publish events on")
+    parser.add_argument(
+        "--format",
+        choices=["json", "msgpack"],
+        default="json",
+        help="Encoding for socket subscribers",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=positive_int,
+        default=256,
+        help="Events buffered per subscriber before it is disconnected",
+    )
+    parser.add_argument(
+        "--output",
+        choices=["text", "jsonl", "none"],
+        default="text",
+        help="What to write to stdout",
+    )
+    args = parser.parse_args()
+
+    publisher = None
+    if args.socket:
+        publisher = DeviceEventPublisher(args.socket, args.format, args.queue_size)
+        try:
+            publisher.start()
+        except OSError as e:
+            parser.error(str(e))
+
+    try:
+        monitor_usb_devices(publisher, args.output)
+    finally:
+        if publisher:
+            publisher.close()
 
 
 if __name__ == "__main__":
-    monitor_usb_devices()
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Simulate many iOS devices serving the device-side socket protocol.
+
+Each virtual device listens on its own host port and behaves like the TCP
+server in CDCDeviceManager: every chunk it receives is answered with
+"Message received: <data>". On top of that a traffic profile generates
+device-initiated load (telemetry bursts, large blobs, random disconnects,
+slow reads).
+
+The running devices are written to a registry file that the `idevice_id` and
+`iproxy` shims in `shims/` read, so the existing client and test harness can
+be pointed at the simulator by putting `python/shims` first on PATH:
+
+    python device_simulator.py --devices 200 --profiles telemetry,flaky
+    PATH=python/shims:$PATH python test_socket.py 2347
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import tempfile
+import time
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+REGISTRY_ENV = "ZANIS_SIM_REGISTRY"
+DEFAULT_REGISTRY = os.path.join(tempfile.gettempdir(), "zanis_sim_devices.json")
+
+# Port the app listens on inside the device (see CDCDeviceManager basePort)
+DEVICE_PORT = 2347
+
+# Traffic profile parameters; intervals are in seconds, sizes in bytes
+PROFILES = {
+    "idle": {},
+    "telemetry": {"burst_interval": 1.0, "burst_size": 20},
+    "blob": {"blob_interval": 5.0, "blob_size": 1 << 20},
+    "flaky": {"burst_interval": 2.0, "burst_size": 5, "disconnect_interval": 30.0},
+    "slow_reader": {"read_delay": 0.5, "read_size": 256},
+}
+
+# Parameters a profile may set
+PROFILE_KEYS = {
+    "burst_interval",
+    "burst_size",
+    "blob_interval",
+    "blob_size",
+    "disconnect_interval",
+    "read_delay",
+    "read_size",
+}
+
+
+def registry_path():
+    """Path of the registry file shared with the shims."""
+    return os.environ.get(REGISTRY_ENV, DEFAULT_REGISTRY)
+
+
+def load_registry(path=None):
+    """Return the list of registered virtual devices, or [] if none are running.
+
+    A registry left behind by a simulator that was killed is ignored.
+    """
+    try:
+        with open(path or registry_path()) as f:
+            registry = json.load(f)
+        pid = registry["pid"]
+        devices = registry["devices"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return []
+    except PermissionError:
+        pass  # Running under another user
+    return devices
+
+
+def write_registry(devices, path=None):
+    path = path or registry_path()
+    entries = [
+        {"udid": d.udid, "device_port": d.device_port, "host_port": d.host_port}
+        for d in devices
+    ]
+    # Write atomically so shims never read a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"pid": os.getpid(), "devices": entries}, f)
+    os.replace(tmp_path, path)
+
+
+class VirtualDevice:
+    """One simulated device: a TCP server plus a traffic profile and counters."""
+
+    def __init__(self, index, host_port, profile_name, profile, rng):
+        self.index = index
+        self.udid = f"00008101-SIM{index:012d}"
+        self.device_port = DEVICE_PORT
+        self.host_port = host_port
+        self.profile_name = profile_name
+        self.profile = profile
+        self.rng = rng
+        self.server = None
+        self.writer = None
+        self.seq = 0
+        self.stats = {
+            "connections": 0,
+            "disconnects_injected": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "messages_in": 0,
+            "messages_out": 0,
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self._handle_connection, "127.0.0.1", self.host_port
+        )
+        # Port 0 lets the OS pick a free port
+        self.host_port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.writer:
+            self.writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        if self.writer is not None:
+            # Like the app, serve a single client at a time
+            writer.close()
+            return
+
+        self.writer = writer
+        self.stats["connections"] += 1
+        tasks = [
+            asyncio.ensure_future(self._receive_loop(reader, writer)),
+            asyncio.ensure_future(self._traffic_loop(writer)),
+        ]
+        if "disconnect_interval" in self.profile:
+            tasks.append(asyncio.ensure_future(self._disconnect_later(writer)))
+
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self.writer = None
+
+    async def _send(self, writer, data):
+        writer.write(data)
+        await writer.drain()
+        self.stats["bytes_out"] += len(data)
+        self.stats["messages_out"] += 1
+
+    async def _receive_loop(self, reader, writer):
+        read_size = self.profile.get("read_size", 65536)
+        read_delay = self.profile.get("read_delay", 0)
+        while True:
+            try:
+                data = await reader.read(read_size)
+            except (ConnectionError, OSError):
+                return
+            if not data:
+                return
+            self.stats["bytes_in"] += len(data)
+            self.stats["messages_in"] += 1
+
+            response = f"Message received: {data.decode('utf-8', errors='replace')}"
+            try:
+                await self._send(writer, response.encode("utf-8"))
+            except (ConnectionError, OSError):
+                return
+            if read_delay:
+                await asyncio.sleep(read_delay)
+
+    async def _traffic_loop(self, writer):
+        burst_interval = self.profile.get("burst_interval")
+        blob_interval = self.profile.get("blob_interval")
+        if not burst_interval and not blob_interval:
+            await asyncio.Event().wait()  # Nothing to generate; wait for cancel
+
+        now = time.monotonic()
+        # Random phase so hundreds of devices don't fire in lockstep
+        next_burst = now + self.rng.uniform(0, burst_interval or 0)
+        next_blob = now + self.rng.uniform(0, blob_interval or 0)
+        while True:
+            now = time.monotonic()
+            try:
+                if burst_interval and now >= next_burst:
+                    for _ in range(self.profile.get("burst_size", 1)):
+                        await self._send(writer, self._telemetry())
+                    next_burst += burst_interval
+                if blob_interval and now >= next_blob:
+                    size = self.profile.get("blob_size", 1 << 20)
+                    await self._send(writer, b"B" * size)
+                    next_blob += blob_interval
+            except (ConnectionError, OSError):
+                return
+
+            deadlines = []
+            if burst_interval:
+                deadlines.append(next_burst)
+            if blob_interval:
+                deadlines.append(next_blob)
+            await asyncio.sleep(max(0, min(deadlines) - time.monotonic()))
+
+    async def _disconnect_later(self, writer):
+        mean = self.profile["disconnect_interval"]
+        await asyncio.sleep(self.rng.expovariate(1 / mean))
+        self.stats["disconnects_injected"] += 1
+        logger.info(f"{self.udid}: injecting disconnect")
+        writer.transport.abort()
+
+    def _telemetry(self):
+        self.seq += 1
+        record = {
+            "type": "telemetry",
+            "udid": self.udid,
+            "seq": self.seq,
+            "ts": time.time(),
+            "battery": self.rng.randint(1, 100),
+        }
+        return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class DeviceSimulator:
+    """Runs a fleet of virtual devices and reports their counters."""
+
+    def __init__(self, count, profiles, base_port=0, seed=None):
+        if not profiles:
+            raise ValueError("At least one profile is required")
+        self.rng = random.Random(seed)
+        self.stop_requested = None
+        self.devices = []
+        for i in range(count):
+            name = profiles[i % len(profiles)]
+            port = base_port + i if base_port else 0
+            rng = random.Random(self.rng.random())
+            self.devices.append(VirtualDevice(i, port, name, PROFILES[name], rng))
+
+    async def start(self):
+        for device in self.devices:
+            await device.start()
+        write_registry(self.devices)
+        logger.info(f"Started {len(self.devices)} virtual devices")
+        logger.info(f"Device registry written to {registry_path()}")
+
+    async def stop(self):
+        for device in self.devices:
+            await device.stop()
+        try:
+            os.unlink(registry_path())
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self):
+        """Return per-device counters keyed by UDID."""
+        return {
+            d.udid: dict(
+                d.stats,
+                profile=d.profile_name,
+                host_port=d.host_port,
+                connected=d.writer is not None,
+            )
+            for d in self.devices
+        }
+
+    def log_totals(self):
+        totals = {}
+        for device in self.devices:
+            for key, value in device.stats.items():
+                totals[key] = totals.get(key, 0) + value
+        connected = sum(1 for d in self.devices if d.writer is not None)
+        logger.info(f"{connected}/{len(self.devices)} devices connected: {totals}")
+
+    async def run(self, duration=None, report_interval=10):
+        self.stop_requested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            # SIGTERM (timeout, kill) shuts down as cleanly as Ctrl+C
+            loop.add_signal_handler(signal.SIGTERM, self.stop_requested.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        await self.start()
+        started = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - started < duration:
+                try:
+                    await asyncio.wait_for(
+                        self.stop_requested.wait(), timeout=report_interval
+                    )
+                    logger.info("Simulation stopped by signal")
+                    break
+                except asyncio.TimeoutError:
+                    self.log_totals()
+        finally:
+            await self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate iOS devices for soak tests")
+    parser.add_argument("--devices", type=int, default=10, help="Number of devices")
+    parser.add_argument(
+        "--profiles",
+        default="telemetry",
+        help=f"Comma-separated profiles assigned round-robin ({', '.join(PROFILES)})",
+    )
+    parser.add_argument(
+        "--profile-file", help="JSON file of extra or overriding profile definitions"
+    )
+    parser.add_argument(
+        "--base-port",
+        type=int,
+        default=0,
+        help="First host port; devices use consecutive ports (default: any free port)",
+    )
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--report-interval", type=float, default=10)
+    parser.add_argument("--stats-file", help="Write per-device counters here on exit")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    args = parser.parse_args()
+
+    if args.profile_file:
+        try:
+            with open(args.profile_file) as f:
+                extra = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"Could not read {args.profile_file}: {e}")
+        if not isinstance(extra, dict):
+            parser.error(f"{args.profile_file} must map profile names to settings")
+        for name, settings in extra.items():
+            if not isinstance(settings, dict):
+                parser.error(f"Profile '{name}' must be an object of settings")
+            bad_keys = sorted(set(settings) - PROFILE_KEYS)
+            if bad_keys:
+                parser.error(
+                    f"Profile '{name}' has unknown key(s): {', '.join(bad_keys)}"
+                    f" (expected {', '.join(sorted(PROFILE_KEYS))})"
+                )
+        PROFILES.update(extra)
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    if not profiles:
+        parser.error("--profiles must name at least one profile")
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown:
+        parser.error(f"Unknown profile(s): {', '.join(unknown)}")
+
+    simulator = DeviceSimulator(args.devices, profiles, args.base_port, args.seed)
+    try:
+        asyncio.run(simulator.run(args.duration, args.report_interval))
+    except KeyboardInterrupt:
+        logger.info("Simulation stopped by user")
+    finally:
+        simulator.log_totals()
+        if args.stats_file:
+            with open(args.stats_file, "w") as f:
+                json.dump(simulator.get_stats(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+import collections
+import selectors
 import socket
 import time
 import logging
 import sys
 import threading
 
+from net_tracker import get_tracker
+from socket_profiles import apply_profile, get_profile, rearm_quickack
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -12,28 +17,225 @@ logger = logging.getLogger(__name__)
 
 
 def get_local_ip():
-    """Get the local IP address of this machine."""
-    try:
-        # Create a socket to determine the local IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # Doesn't need to be reachable, just to determine the interface
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception as e:
-        logger.error(f"Error getting local IP: {e}")
-        # Fallback to localhost
-        return "127.0.0.1"
+    """Get the local IP address of this machine, cached until addresses change."""
+    return get_tracker().get_local_ip()
+
+
+# Limit keys accepted by EthernetServer; a value of None means unlimited.
+# The stream has no message framing, so a "message" is one recv() chunk
+# inbound and one queued send() payload outbound.
+LIMIT_KEYS = (
+    "in_bytes_per_sec",
+    "in_messages_per_sec",
+    "out_bytes_per_sec",
+    "out_messages_per_sec",
+)
+
+# Stop reading from a device while this much of its output is still queued
+MAX_BACKLOG = 64 * 1024
+
+
+class TokenBucket:
+    """Simple token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def available(self):
+        """Return the number of whole tokens currently available."""
+        with self.lock:
+            self._refill()
+            return max(0, int(self.tokens))
+
+    def has_tokens(self):
+        """Return True if the bucket is not empty or in debt."""
+        with self.lock:
+            self._refill()
+            return self.tokens > 0
+
+    def charge(self, amount):
+        """Take `amount` tokens unconditionally, allowing the bucket to go negative."""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class ClientConnection:
+    """Per-device connection state: socket, rate limiters, outbox and counters."""
+
+    def __init__(self, sock, address, limits, buffer_size):
+        self.socket = sock
+        self.address = address
+        self.deficit = 0
+        self.throttled = False
+        self.send_throttled = False
+        self.write_blocked = False
+        self.closed = False
+        self.events = 0  # Events currently registered with the selector
+
+        # Outgoing messages wait here until the limits and the socket allow
+        self.outbox = collections.deque()
+        self.out_buffer = b""
+        self.backlog = 0
+        self.out_lock = threading.Lock()
+
+        # Byte buckets hold at least one full read so a slow rate still progresses
+        self.in_bytes = _make_bucket(limits.get("in_bytes_per_sec"), buffer_size)
+        self.in_messages = _make_bucket(limits.get("in_messages_per_sec"), 1)
+        self.out_bytes = _make_bucket(limits.get("out_bytes_per_sec"), buffer_size)
+        self.out_messages = _make_bucket(limits.get("out_messages_per_sec"), 1)
+
+        self.stats = {
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "messages_in": 0,
+            "messages_out": 0,
+            "throttled_reads": 0,
+            "throttled_sends": 0,
+        }
+
+    def read_budget(self, max_bytes):
+        """Return how many bytes may be read now, or 0 if reading must pause.
+
+        Reads pause when the inbound limit is hit or when the device is not
+        reading its own replies fast enough.
+        """
+        if self.backlog > MAX_BACKLOG:
+            return 0
+        if self.in_messages and self.in_messages.available() < 1:
+            return 0
+        if self.in_bytes:
+            return min(max_bytes, self.in_bytes.available())
+        return max_bytes
+
+    def record_read(self, size):
+        if self.in_messages:
+            self.in_messages.charge(1)
+        if self.in_bytes:
+            self.in_bytes.charge(size)
+        self.stats["bytes_in"] += size
+        self.stats["messages_in"] += 1
+
+    def queue_send(self, payload):
+        with self.out_lock:
+            self.outbox.append(payload)
+            self.backlog += len(payload)
+
+    def _send_allowed(self):
+        if self.out_messages and not self.out_messages.has_tokens():
+            return False
+        if self.out_bytes and not self.out_bytes.has_tokens():
+            return False
+        return True
+
+    def flush(self):
+        """Write queued data without blocking.
+
+        Returns "idle" when the outbox is empty, "blocked" when the socket
+        buffer is full, or "throttled" when the outbound limit is exhausted.
+        A message larger than the bucket is let through and leaves the bucket
+        in debt, so later sends wait until the rate has paid for it.
+        """
+        while True:
+            if not self.out_buffer:
+                with self.out_lock:
+                    if not self.outbox:
+                        return "idle"
+                    if not self._send_allowed():
+                        # Count each stretch of waiting once, not every retry
+                        if not self.send_throttled:
+                            self.send_throttled = True
+                            self.stats["throttled_sends"] += 1
+                        return "throttled"
+                    self.send_throttled = False
+                    self.out_buffer = self.outbox.popleft()
+                if self.out_messages:
+                    self.out_messages.charge(1)
+                if self.out_bytes:
+                    self.out_bytes.charge(len(self.out_buffer))
+
+            try:
+                sent = self.socket.send(self.out_buffer)
+            except BlockingIOError:
+                return "blocked"
+            self.out_buffer = self.out_buffer[sent:]
+            with self.out_lock:
+                self.backlog -= sent
+            self.stats["bytes_out"] += sent
+            if not self.out_buffer:
+                self.stats["messages_out"] += 1
+
+    def close(self):
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+
+
+def _make_bucket(rate, min_capacity):
+    return TokenBucket(rate, max(rate, min_capacity)) if rate else None
 
 
 class EthernetServer:
-    def __init__(self, host="127.0.0.1", port=2345):
+    """TCP server that serves many devices with per-connection rate limits.
+
+    `limits` may contain `in_bytes_per_sec`, `in_messages_per_sec`,
+    `out_bytes_per_sec` and `out_messages_per_sec`; missing keys are unlimited.
+    Reads are scheduled with deficit round robin, each readable connection
+    earning `quantum` bytes of read credit per round; a single read is at
+    most `max(quantum, buffer_size)` bytes, and an inbound "message" is one
+    such read. `throttled_reads` and `throttled_sends` in the stats count how
+    often a connection had to wait, not how often it was retried. Outgoing data is queued
+    per connection and written without blocking, so a device that reads slowly
+    only delays itself. `socket_profile` names the TCP tuning profile from
+    socket_profiles applied to every connection.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=2345,
+        limits=None,
+        quantum=1024,
+        socket_profile="default",
+    ):
+        self.limits = limits or {}
+        for key, value in self.limits.items():
+            if key not in LIMIT_KEYS:
+                raise ValueError(f"Unknown limit '{key}'")
+            if value is not None and value <= 0:
+                raise ValueError(f"Limit {key} must be positive, got {value}")
+        if quantum <= 0:
+            raise ValueError(f"quantum must be positive, got {quantum}")
+        # Fail on a misspelt profile now rather than as a server error later
+        self.profile = get_profile(socket_profile)
+
         self.host = host
         self.port = port
+        self.socket_profile = socket_profile
+        self.quantum = quantum
+        self.buffer_size = 1024
+        # Reads may exceed buffer_size so a large quantum is actually used
+        self.read_size = max(quantum, self.buffer_size)
         self.server_socket = None
-        self.client_socket = None
-        self.client_address = None
+        self.selector = None
+        self.connections = {}
+        self.connections_lock = threading.Lock()
+        self.paused = []  # Connections whose reads are paused
+        self.pending = set()  # Connections with queued output to flush
+        self.wake_reader = None
+        self.wake_writer = None
         self.is_running = False
         self.receive_thread = None
         self.heartbeat_thread = None
@@ -43,12 +245,28 @@ class EthernetServer:
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Accepted sockets inherit the listening socket's buffer sizes
+            apply_profile(self.server_socket, self.profile)
             logger.info(f"Binding to {self.host}:{self.port}...")
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(1)
+            self.server_socket.listen(socket.SOMAXCONN)
+            self.selector = selectors.DefaultSelector()
+            # Lets other threads wake the receive loop when they queue output
+            self.wake_reader, self.wake_writer = socket.socketpair()
+            self.wake_reader.setblocking(False)
+            self.wake_writer.setblocking(False)
+            self.selector.register(self.wake_reader, selectors.EVENT_READ, None)
             self.is_running = True
             logger.info(f"Server started on {self.host}:{self.port}")
 
+            # Start receive and heartbeat threads
+            self.receive_thread = threading.Thread(target=self._receive_loop)
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
+            self.receive_thread.daemon = True
+            self.heartbeat_thread.daemon = True
+            self.receive_thread.start()
+            self.heartbeat_thread.start()
+
             # Accept client connections
             self._accept_connections()
 
@@ -59,98 +277,279 @@ class EthernetServer:
     def _accept_connections(self):
         """Accept incoming connections."""
         logger.info("Waiting for connections...")
+        # Short timeout to allow checking is_running
+        self.server_socket.settimeout(1)
         while self.is_running:
             try:
-                self.server_socket.settimeout(
-                    1
-                )  # Short timeout to allow checking is_running
-                self.client_socket, self.client_address = self.server_socket.accept()
-                logger.info(f"✅ Client connected: {self.client_address}")
-
-            # Start receive and heartbeat threads
-            self.receive_thread = threading.Thread(target=self._receive_loop)
-            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
-            self.receive_thread.daemon = True
-            self.heartbeat_thread.daemon = True
-            self.receive_thread.start()
-            self.heartbeat_thread.start()
-
-                # Wait for the client to disconnect before accepting another
-                self.receive_thread.join()
-                logger.info("Client disconnected, waiting for new connections")
+                client_socket, client_address = self.server_socket.accept()
+                apply_profile(client_socket, self.profile)
+                client_socket.setblocking(False)
+                connection = ClientConnection(
+                    client_socket, client_address, self.limits, self.buffer_size
+                )
+                with self.connections_lock:
+                    self.connections[client_address] = connection
+                    self.selector.register(
+                        client_socket, selectors.EVENT_READ, connection
+                    )
+                    connection.events = selectors.EVENT_READ
+                logger.info(f"✅ Client connected: {client_address}")
 
             except socket.timeout:
                 continue
-        except Exception as e:
+            except Exception as e:
                 if self.is_running:
                     logger.error(f"Accept error: {e}")
                     time.sleep(1)  # Prevent rapid retry on error
 
     def _receive_loop(self):
-        """Continuously receive data from the connected client."""
-        self.client_socket.settimeout(1)  # 1 second timeout
-        while self.is_running and self.client_socket:
+        """Serve all clients, scheduling reads with deficit round robin."""
+        active = collections.deque()
+        while self.is_running:
+            self._resume_throttled()
+            self._flush_pending()
+
+            # Don't block while connections still have unread data
+            if active:
+                timeout = 0
+            elif self.paused or self.pending:
+                timeout = 0.05
+            else:
+                timeout = 1
             try:
-                data = self.client_socket.recv(1024)
-                if not data:
-                    logger.info("Client closed connection")
-                    break
-                logger.info(f"Received: {data.decode('utf-8')}")
+                events = self.selector.select(timeout)
+            except (AttributeError, OSError, ValueError):
+                if self.is_running:
+                    time.sleep(timeout)
+                continue
 
-                # Echo back the data
-                response = f"Echo: {data.decode('utf-8')}"
-                self.send(response)
+            for key, mask in events:
+                connection = key.data
+                if connection is None:
+                    self._drain_wakeups()
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    connection.write_blocked = False
+                    with self.connections_lock:
+                        self.pending.add(connection)
+                if mask & selectors.EVENT_READ and connection not in active:
+                    active.append(connection)
+
+            # One round: every backlogged connection gets a single turn
+            for _ in range(len(active)):
+                connection = active.popleft()
+                if self._service_connection(connection):
+                    active.append(connection)
+
+    def _drain_wakeups(self):
+        try:
+            while self.wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
 
-            except socket.timeout:
+    def _wake(self):
+        try:
+            self.wake_writer.send(b"\0")
+        except (AttributeError, BlockingIOError, OSError):
+            pass
+
+    def _service_connection(self, connection):
+        """Give a connection one read turn. Returns True if it is still backlogged."""
+        if connection.closed:
+            return False
+
+        budget = connection.read_budget(self.read_size)
+        if budget <= 0:
+            self._pause(connection)
+            return False
+
+        # Credit is capped at one full read so it cannot pile up while the
+        # inbound limit keeps reads short
+        connection.deficit = min(connection.deficit + self.quantum, self.read_size)
+        size = min(connection.deficit, budget)
+        try:
+            data = connection.socket.recv(size)
+            rearm_quickack(connection.socket, self.profile)
+        except BlockingIOError:
+            connection.deficit = 0
+            return False
+        except Exception as e:
+            logger.error(f"Receive error from {connection.address}: {e}")
+            self._drop(connection)
+            return False
+
+        if not data:
+            logger.info(f"Client closed connection: {connection.address}")
+            self._drop(connection)
+            return False
+
+        connection.record_read(len(data))
+        connection.deficit -= len(data)
+        message = data.decode("utf-8", errors="replace")
+        logger.info(f"Received from {connection.address}: {message}")
+
+        # Echo back the data
+        self.send(f"Echo: {message}", connection)
+
+        if len(data) < size:
+            # Socket drained; an idle connection keeps no credit
+            connection.deficit = 0
+            return False
+        return True
+
+    def _flush_pending(self):
+        """Write queued output for every connection that has some."""
+        with self.connections_lock:
+            pending = list(self.pending)
+            self.pending.clear()
+
+        for connection in pending:
+            if connection.closed:
                 continue
+            try:
+                state = connection.flush()
             except Exception as e:
-                logger.error(f"Receive error: {e}")
-                break
+                logger.error(f"Send error to {connection.address}: {e}")
+                # Don't close the server, just the client connection
+                self._drop(connection)
+                continue
 
-        # Clean up client connection
-        if self.client_socket:
-            self.client_socket.close()
-            self.client_socket = None
-            self.client_address = None
+            if state == "throttled":
+                # Retried on the next loop once the bucket refills
+                with self.connections_lock:
+                    self.pending.add(connection)
+            connection.write_blocked = state == "blocked"
+            self._update_interest(connection)
+
+    def _update_interest(self, connection):
+        """Register for the events this connection currently needs."""
+        events = 0
+        if not connection.throttled:
+            events |= selectors.EVENT_READ
+        if connection.write_blocked:
+            events |= selectors.EVENT_WRITE
+
+        with self.connections_lock:
+            if connection.closed or events == connection.events:
+                return
+            try:
+                if not connection.events:
+                    self.selector.register(connection.socket, events, connection)
+                elif not events:
+                    self.selector.unregister(connection.socket)
+                else:
+                    self.selector.modify(connection.socket, events, connection)
+            except (KeyError, ValueError, OSError):
+                pass
+            connection.events = events
+
+    def _pause(self, connection):
+        """Stop reading from a connection until it has read budget again."""
+        connection.deficit = 0
+        if connection.throttled:
+            return
+        connection.stats["throttled_reads"] += 1
+        connection.throttled = True
+        self._update_interest(connection)
+        self.paused.append(connection)
+        logger.debug(f"Reads paused for {connection.address}, throttling")
+
+    def _resume_throttled(self):
+        """Resume reading from paused connections that have read budget again."""
+        for connection in list(self.paused):
+            if connection.closed:
+                self.paused.remove(connection)
+            elif connection.read_budget(1) > 0:
+                self.paused.remove(connection)
+                connection.throttled = False
+                self._update_interest(connection)
 
     def _heartbeat_loop(self):
         """Send periodic heartbeat messages."""
-        while self.is_running and self.client_socket:
+        while self.is_running:
             try:
-                self.send("server_heartbeat")
+                if self.connections:
+                    self.send("server_heartbeat")
                 time.sleep(5)  # Send heartbeat every 5 seconds
             except Exception:
                 break
 
-    def send(self, message):
-        """Send data to the connected client."""
-        if not self.client_socket:
+    def send(self, message, connection=None):
+        """Queue data for one client, or for every connected client.
+
+        Nothing is dropped: data waits in the connection's outbox until its
+        outbound limits and socket buffer allow it to be written.
+        """
+        if connection is not None:
+            targets = [connection]
+        else:
+            with self.connections_lock:
+                targets = list(self.connections.values())
+        if not targets:
             logger.error("No client connected")
             return
 
-        try:
-            self.client_socket.sendall(message.encode("utf-8"))
-            logger.info(f"Sent: {message}")
-        except Exception as e:
-            logger.error(f"Send error: {e}")
-            # Don't close the server, just the client connection
-            if self.client_socket:
-                self.client_socket.close()
-                self.client_socket = None
-                self.client_address = None
+        payload = message.encode("utf-8")
+        for target in targets:
+            if target.closed:
+                continue
+            target.queue_send(payload)
+            with self.connections_lock:
+                self.pending.add(target)
+            logger.info(f"Queued for {target.address}: {message}")
+        if threading.current_thread() is not self.receive_thread:
+            self._wake()
+
+    def _drop(self, connection):
+        """Forget a client connection and close its socket."""
+        with self.connections_lock:
+            if connection.closed:
+                return
+            connection.closed = True
+            self.connections.pop(connection.address, None)
+            self.pending.discard(connection)
+            if connection.events:
+                try:
+                    self.selector.unregister(connection.socket)
+                except (KeyError, ValueError):
+                    pass
+        connection.close()
+        logger.info(f"Client disconnected: {connection.address}")
+
+    def get_stats(self):
+        """Return traffic counters and throttle state for each connected client."""
+        with self.connections_lock:
+            connections = list(self.connections.values())
+        return {
+            f"{c.address[0]}:{c.address[1]}": dict(
+                c.stats, backlog=c.backlog, throttled=c.throttled
+            )
+            for c in connections
+        }
 
     def close(self):
         """Close the server."""
         self.is_running = False
 
-        if self.client_socket:
-            self.client_socket.close()
-            self.client_socket = None
+        with self.connections_lock:
+            connections = list(self.connections.values())
+        for connection in connections:
+            self._drop(connection)
 
         if self.server_socket:
             self.server_socket.close()
             self.server_socket = None
 
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+
+        for sock in (self.wake_reader, self.wake_writer):
+            if sock:
+                sock.close()
+        self.wake_reader = self.wake_writer = None
+
         logger.info("Server closed")
 
 
@@ -160,7 +559,15 @@ def main():
     else:
         port = 2345
 
-    server = EthernetServer(port=port)
+    socket_profile = sys.argv[2] if len(sys.argv) > 2 else "default"
+    try:
+        get_profile(socket_profile)
+    except ValueError as e:
+        print("Usage: python ethernet_client.py [port] [socket_profile]")
+        print(e)
+        sys.exit(1)
+
+    server = EthernetServer(port=port, socket_profile=socket_profile)
 
     try:
         server.start()
@@ -169,11 +576,16 @@ def main():
         while server.is_running:
             try:
                 # Get user input
-                message = input("Enter message to send to client (or 'quit' to exit): ")
+                message = input(
+                    "Enter message to send to clients ('stats' for traffic, 'quit' to exit): "
+                )
                 if message.lower() == "quit":
                     break
 
-                if server.client_socket:
+                if message.lower() == "stats":
+                    for address, stats in server.get_stats().items():
+                        logger.info(f"{address}: {stats}")
+                elif server.connections:
                     server.send(message)
                 else:
                     logger.info("No client connected. Message not sent.")
@@ -1,9 +1,13 @@
+import asyncio
+import codecs
 import socket
 import time
 import logging
 import sys
 import threading
 
+from socket_profiles import apply_profile, corked, get_profile, rearm_quickack
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -12,9 +16,12 @@ logger = logging.getLogger(__name__)
 
 
 class EthernetClient:
-    def __init__(self, host="127.0.0.1", port=2345):
+    def __init__(self, host="127.0.0.1", port=2345, socket_profile="default"):
+        # Fail on a misspelt profile now rather than as a connection error later
+        self.profile = get_profile(socket_profile)
         self.host = host
         self.port = port
+        self.socket_profile = socket_profile
         self.socket = None
         self.is_connected = False
         self.receive_thread = None
@@ -32,6 +39,7 @@ class EthernetClient:
                 self.disconnect()
 
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            apply_profile(self.socket, self.profile)
             self.socket.settimeout(10)  # 10 second timeout for connection
             logger.info(f"Connecting to {self.host}:{self.port}...")
             self.socket.connect((self.host, self.port))
@@ -80,6 +88,7 @@ class EthernetClient:
         while self.is_connected:
             try:
                 data = self.socket.recv(1024)
+                rearm_quickack(self.socket, self.profile)
                 if not data:
                     logger.info("Connection closed by server")
                     self.disconnect()
@@ -138,6 +147,25 @@ class EthernetClient:
                 self._start_reconnect_thread()
             return False
 
+    def send_batch(self, messages):
+        """Send several messages, coalesced into as few segments as the profile allows."""
+        if not self.is_connected or not self.socket:
+            logger.error("Not connected, cannot send message")
+            return False
+
+        try:
+            with corked(self.socket, self.profile):
+                for message in messages:
+                    self.socket.sendall(message.encode("utf-8"))
+            logger.info(f"Sent batch of {len(messages)} messages")
+            return True
+        except Exception as e:
+            logger.error(f"Send error: {e}")
+            self.disconnect()
+            if self.auto_reconnect:
+                self._start_reconnect_thread()
+            return False
+
     def disconnect(self):
         """Disconnect from the server."""
         self.is_connected = False
@@ -156,6 +184,240 @@ class EthernetClient:
         logger.info(f"Auto reconnect {'enabled' if enabled else 'disabled'}")
 
 
+class AsyncEthernetClient:
+    """asyncio client for the Ethernet server.
+
+    Received messages are delivered through async iteration, and `send`
+    applies flow control by awaiting `drain`. Reconnection and heartbeats run
+    inside the event loop, so many links can share one thread. Iteration ends
+    once the client is closed, or once the connection is lost for good
+    (already-received messages are delivered first):
+
+        async with AsyncEthernetClient(host, port) as client:
+            await client.send("hello")
+            async for message in client:
+                ...
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=2345,
+        auto_reconnect=True,
+        reconnect_delay=5,
+        heartbeat_interval=5,
+        queue_size=1024,
+        socket_profile="default",
+    ):
+        self.profile = get_profile(socket_profile)
+        self.host = host
+        self.port = port
+        self.socket_profile = socket_profile
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_delay = reconnect_delay  # seconds
+        self.heartbeat_interval = heartbeat_interval  # seconds
+        self.queue_size = queue_size
+        self.reader = None
+        self.writer = None
+        self.is_connected = False
+        self._messages = None
+        self._send_lock = None
+        self._stopped = None  # Set whenever no more messages can arrive
+        self._run_task = None
+        self._closed = False
+
+    def _ensure_state(self):
+        # Created lazily so they belong to the running event loop
+        if self._messages is None:
+            self._messages = asyncio.Queue(maxsize=self.queue_size)
+            self._send_lock = asyncio.Lock()
+            self._stopped = asyncio.Event()
+            self._stopped.set()
+
+    async def connect(self):
+        """Connect to the server and start delivering messages.
+
+        Returns False if the first attempt fails; with auto_reconnect the
+        client keeps retrying in the background.
+        """
+        self._ensure_state()
+        self._closed = False
+
+        connected = await self._open()
+        if connected or self.auto_reconnect:
+            if self._run_task is None or self._run_task.done():
+                self._stopped.clear()
+                self._run_task = asyncio.ensure_future(self._run(connected))
+        return connected
+
+    async def _open(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Buffer sizes must be set before connecting to affect the window
+        apply_profile(sock, self.profile)
+        sock.setblocking(False)
+        try:
+            logger.info(f"Connecting to {self.host}:{self.port}...")
+            loop = asyncio.get_running_loop()
+            await asyncio.wait_for(
+                loop.sock_connect(sock, (self.host, self.port)), timeout=10
+            )
+            self.reader, self.writer = await asyncio.open_connection(sock=sock)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.error(f"Connection error: {e}")
+            sock.close()
+            return False
+        self.is_connected = True
+        logger.info(f"✅ Connected successfully to {self.host}:{self.port}")
+        return True
+
+    async def _run(self, connected=True):
+        """Receive until disconnected, reconnecting while auto_reconnect is set.
+
+        If the first attempt in connect() failed, wait before retrying.
+        """
+        try:
+            if not connected:
+                logger.info(
+                    f"Attempting to reconnect in {self.reconnect_delay} seconds..."
+                )
+                await asyncio.sleep(self.reconnect_delay)
+            while not self._closed:
+                if not self.is_connected and not await self._open():
+                    if not self.auto_reconnect:
+                        break
+                    logger.info(
+                        f"Attempting to reconnect in {self.reconnect_delay} seconds..."
+                    )
+                    await asyncio.sleep(self.reconnect_delay)
+                    continue
+
+                heartbeat_task = asyncio.ensure_future(self._heartbeat_loop())
+                try:
+                    await self._receive_loop()
+                finally:
+                    heartbeat_task.cancel()
+                    await self._close_writer()
+
+                if not self.auto_reconnect or self._closed:
+                    break
+                logger.info(
+                    f"Attempting to reconnect in {self.reconnect_delay} seconds..."
+                )
+                await asyncio.sleep(self.reconnect_delay)
+        finally:
+            self._stopped.set()
+
+    async def _receive_loop(self):
+        """Queue received data until the connection drops."""
+        # Per connection, so a character split across reads decodes intact
+        # and a dropped link doesn't leave half a character behind
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            try:
+                data = await self.reader.read(1024)
+            except (ConnectionError, OSError) as e:
+                if not self._closed:
+                    logger.error(f"Receive error: {e}")
+                return
+            if not data:
+                if not self._closed:
+                    logger.info("Connection closed by server")
+                return
+
+            message = decoder.decode(data)
+            if not message or message == "server_heartbeat":
+                continue
+            # Blocks when the consumer falls behind, which stops reading and
+            # lets TCP flow control push back on the server
+            await self._messages.put(message)
+
+    async def _heartbeat_loop(self):
+        """Send periodic heartbeat messages."""
+        while self.is_connected:
+            if not await self.send("client_heartbeat"):
+                break
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def send(self, message):
+        """Send data to the server, waiting for the write buffer to drain."""
+        if not self.is_connected or not self.writer:
+            logger.error("Not connected, cannot send message")
+            return False
+
+        try:
+            async with self._send_lock:
+                self.writer.write(message.encode("utf-8"))
+                await self.writer.drain()
+            # Skip logging heartbeats to reduce noise
+            if message != "client_heartbeat":
+                logger.info(f"Sent: {message}")
+            return True
+        except (ConnectionError, OSError) as e:
+            logger.error(f"Send error: {e}")
+            await self._close_writer()
+            return False
+
+    async def _close_writer(self):
+        self.is_connected = False
+        writer, self.writer = self.writer, None
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def close(self):
+        """Disconnect and stop reconnecting; pending iteration ends."""
+        self._closed = True
+        await self._close_writer()
+        if self._run_task:
+            self._run_task.cancel()
+            try:
+                await self._run_task
+            except asyncio.CancelledError:
+                pass
+            self._run_task = None
+        if self._stopped:
+            self._stopped.set()
+        logger.info("Disconnected from server")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._ensure_state()
+        while True:
+            if self._closed:
+                raise StopAsyncIteration
+            if not self._messages.empty():
+                return self._messages.get_nowait()
+            if self._stopped.is_set():
+                raise StopAsyncIteration
+
+            getter = asyncio.ensure_future(self._messages.get())
+            stopped = asyncio.ensure_future(self._stopped.wait())
+            try:
+                await asyncio.wait(
+                    {getter, stopped}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                stopped.cancel()
+                received = getter.done()
+                if not received:
+                    # Nothing was taken off the queue, so no message is lost
+                    getter.cancel()
+            if received:
+                return getter.result()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
 def main():
     if len(sys.argv) > 1:
         host = sys.argv[1]
@@ -167,7 +429,15 @@ def main():
     else:
         port = 2345
 
-    client = EthernetClient(host, port)
+    socket_profile = sys.argv[3] if len(sys.argv) > 3 else "default"
+    try:
+        get_profile(socket_profile)
+    except ValueError as e:
+        print("Usage: python ethernet_client_connector.py [host] [port] [socket_profile]")
+        print(e)
+        sys.exit(1)
+
+    client = EthernetClient(host, port, socket_profile)
 
     try:
         client.connect()
@@ -0,0 +1,285 @@
+import os
+import socket
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Kernel TCP states as they appear in /proc/net/tcp
+TCP_STATES = {
+    "01": "ESTABLISHED",
+    "02": "SYN_SENT",
+    "03": "SYN_RECV",
+    "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2",
+    "06": "TIME_WAIT",
+    "07": "CLOSE",
+    "08": "CLOSE_WAIT",
+    "09": "LAST_ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+}
+
+# rtnetlink multicast groups for link and address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+# ioctl returning an interface's primary IPv4 address
+SIOCGIFADDR = 0x8915
+
+# Without rtnetlink there is no change signal, so cached values expire instead
+CACHE_TTL = 30  # seconds
+
+
+def _parse_address(field, family):
+    """Decode a hex `address:port` field from /proc/net/tcp{,6}."""
+    address, port = field.split(":")
+    raw = bytes.fromhex(address)
+    if family == socket.AF_INET:
+        packed = raw[::-1]
+    else:
+        # Four 32-bit words, each in host (little-endian) byte order
+        packed = b"".join(raw[i : i + 4][::-1] for i in range(0, 16, 4))
+    return socket.inet_ntop(family, packed), int(port, 16)
+
+
+def _ipv4_address(sock, name):
+    """Return the primary IPv4 address of interface `name`, or "" if it has none."""
+    # Imported here so modules that only need get_local_ip work without fcntl
+    import fcntl
+
+    try:
+        ifreq = struct.pack("256s", name.encode("utf-8")[:15])
+        result = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, ifreq)
+        return socket.inet_ntoa(result[20:24])
+    except OSError:
+        return ""
+
+
+class NetworkTracker:
+    """Incremental table of TCP connections and interfaces read from /proc and /sys.
+
+    `get_*` returns the current table, and each `poll_*` call returns only
+    what changed since the previous poll, so dumping the full table does not
+    swallow deltas meant for a monitor. When rtnetlink is available the
+    tracker subscribes to link/address events so interface scans and the
+    local IP lookup only happen after the kernel reports a change.
+    """
+
+    def __init__(self, proc_root="/proc", sys_root="/sys"):
+        self.proc_root = proc_root
+        self.sys_root = sys_root
+        self.connections = {}
+        self.interfaces = {}
+        # Tables as of the last poll, which deltas are computed against
+        self._polled_connections = {}
+        self._polled_interfaces = {}
+        self.lock = threading.Lock()
+        self._local_ip = None
+        self._local_ip_time = 0
+        self._interfaces_dirty = True
+        self._interfaces_time = 0
+        self._netlink = self._open_netlink()
+
+    @staticmethod
+    def is_supported(proc_root="/proc"):
+        """Return True if this system exposes /proc/net/tcp."""
+        return os.path.exists(os.path.join(proc_root, "net", "tcp"))
+
+    def _open_netlink(self):
+        """Subscribe to rtnetlink link/address events, if the platform allows it."""
+        if not hasattr(socket, "AF_NETLINK"):
+            return None
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+            )
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            logger.debug(f"rtnetlink unavailable, falling back to expiry: {e}")
+            return None
+
+    def _drain_netlink(self):
+        """Consume pending rtnetlink events. Returns True if any arrived."""
+        if self._netlink is None:
+            return False
+        changed = False
+        while True:
+            try:
+                data = self._netlink.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Receive buffer overflowed; events were lost so assume a change
+                changed = True
+                break
+            if not data:
+                break
+            changed = True
+        return changed
+
+    def _check_address_changes(self):
+        if self._drain_netlink():
+            self._interfaces_dirty = True
+            self._local_ip = None
+
+    def read_connections(self):
+        """Read the current TCP connection table from /proc/net/tcp{,6}."""
+        table = {}
+        for name, family in (("tcp", socket.AF_INET), ("tcp6", socket.AF_INET6)):
+            path = os.path.join(self.proc_root, "net", name)
+            try:
+                with open(path) as f:
+                    next(f, None)  # Header line
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) < 4:
+                            continue
+                        local = _parse_address(fields[1], family)
+                        remote = _parse_address(fields[2], family)
+                        state = TCP_STATES.get(fields[3], fields[3])
+                        table[(name, local, remote)] = state
+            except FileNotFoundError:
+                continue
+        return table
+
+    def read_interfaces(self):
+        """Read the current interface table from /sys/class/net and /proc/net/if_inet6.
+
+        IPv4 addresses come from SIOCGIFADDR, which reports the primary one.
+        """
+        table = {}
+        net_dir = os.path.join(self.sys_root, "class", "net")
+        try:
+            names = os.listdir(net_dir)
+        except FileNotFoundError:
+            return table
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for name in names:
+                info = {"ipv4": _ipv4_address(sock, name), "ipv6": []}
+                for attr in ("operstate", "address", "mtu"):
+                    try:
+                        with open(os.path.join(net_dir, name, attr)) as f:
+                            info[attr] = f.read().strip()
+                    except OSError:
+                        info[attr] = ""
+                table[name] = info
+
+        try:
+            with open(os.path.join(self.proc_root, "net", "if_inet6")) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 6 and fields[5] in table:
+                        address = socket.inet_ntop(
+                            socket.AF_INET6, bytes.fromhex(fields[0])
+                        )
+                        table[fields[5]]["ipv6"].append(address)
+        except FileNotFoundError:
+            pass
+
+        # Kernel order can vary between reads; don't report that as a change
+        for info in table.values():
+            info["ipv6"].sort()
+        return table
+
+    @staticmethod
+    def _diff(previous, current):
+        added = {k: v for k, v in current.items() if k not in previous}
+        removed = {k: v for k, v in previous.items() if k not in current}
+        changed = {
+            k: v for k, v in current.items() if k in previous and previous[k] != v
+        }
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def get_connections(self):
+        """Refresh and return the connection table."""
+        current = self.read_connections()
+        with self.lock:
+            self.connections = current
+        return current
+
+    def poll_connections(self):
+        """Refresh the connection table and return added/removed/changed entries."""
+        current = self.get_connections()
+        with self.lock:
+            delta = self._diff(self._polled_connections, current)
+            self._polled_connections = current
+        return delta
+
+    def get_interfaces(self):
+        """Return the interface table, re-reading it only when it may have changed.
+
+        With rtnetlink the kernel tables are only re-read after an event.
+        """
+        self._check_address_changes()
+        now = time.monotonic()
+        expired = now - self._interfaces_time > CACHE_TTL
+        if not self._interfaces_dirty and (self._netlink is not None or not expired):
+            return self.interfaces
+
+        current = self.read_interfaces()
+        with self.lock:
+            changed = current != self.interfaces
+            self.interfaces = current
+            self._interfaces_dirty = False
+            self._interfaces_time = now
+        if changed:
+            self._local_ip = None
+        return current
+
+    def poll_interfaces(self):
+        """Refresh the interface table and return added/removed/changed entries."""
+        current = self.get_interfaces()
+        with self.lock:
+            delta = self._diff(self._polled_interfaces, current)
+            self._polled_interfaces = current
+        return delta
+
+    def get_local_ip(self):
+        """Return the local IP address, cached until addresses change."""
+        self._check_address_changes()
+        now = time.monotonic()
+        if self._local_ip is not None and (
+            self._netlink is not None or now - self._local_ip_time < CACHE_TTL
+        ):
+            return self._local_ip
+
+        try:
+            # Doesn't need to be reachable, just to determine the interface
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                s.connect(("8.8.8.8", 80))
+                self._local_ip = s.getsockname()[0]
+            finally:
+                s.close()
+        except Exception as e:
+            logger.error(f"Error getting local IP: {e}")
+            # Fallback to localhost, but don't cache it
+            return "127.0.0.1"
+
+        self._local_ip_time = now
+        return self._local_ip
+
+    def close(self):
+        if self._netlink is not None:
+            self._netlink.close()
+            self._netlink = None
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    """Return the shared process-wide NetworkTracker."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = NetworkTracker()
+        return _tracker
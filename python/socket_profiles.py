@@ -0,0 +1,131 @@
+import contextlib
+import logging
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Named TCP tuning profiles. Times are in seconds except user_timeout (ms);
+# buffer sizes are in bytes. Options missing from a profile keep OS defaults.
+PROFILES = {
+    "default": {},
+    # Small heartbeats and commands: no Nagle, fast dead-link detection
+    "low_latency": {
+        "nodelay": True,
+        "quickack": True,
+        "keepidle": 10,
+        "keepintvl": 5,
+        "keepcnt": 3,
+        "user_timeout": 20000,
+    },
+    # Large transfers over iproxy: big buffers, coalesce batched writes
+    "bulk": {
+        "nodelay": False,
+        "cork": True,
+        "sndbuf": 4 * 1024 * 1024,
+        "rcvbuf": 4 * 1024 * 1024,
+        "keepidle": 60,
+        "keepintvl": 10,
+        "keepcnt": 5,
+        "user_timeout": 60000,
+    },
+    # Keep the radio idle: rare keepalives, tolerate long stalls
+    "battery": {
+        "nodelay": False,
+        "keepidle": 600,
+        "keepintvl": 60,
+        "keepcnt": 4,
+        "user_timeout": 300000,
+    },
+}
+
+# macOS names the keepalive idle option TCP_KEEPALIVE
+_TCP_KEEPIDLE = getattr(socket, "TCP_KEEPIDLE", getattr(socket, "TCP_KEEPALIVE", None))
+
+
+def get_profile(name):
+    """Look up a profile by name; "low-latency" and "low_latency" are equivalent."""
+    key = (name or "default").replace("-", "_").lower()
+    if key not in PROFILES:
+        raise ValueError(
+            f"Unknown socket profile '{name}' (expected one of {', '.join(PROFILES)})"
+        )
+    return PROFILES[key]
+
+
+def _set(sock, level, option, value, label):
+    if option is None:
+        logger.debug(f"{label} not supported on this platform")
+        return False
+    try:
+        sock.setsockopt(level, option, value)
+        return True
+    except OSError as e:
+        logger.debug(f"Could not set {label}: {e}")
+        return False
+
+
+def apply_profile(sock, profile):
+    """Apply a profile to a TCP socket and return the options that took effect.
+
+    `profile` is a dict from get_profile(); callers look it up once and reuse
+    it for every socket. Buffer sizes only affect the TCP window if set
+    before connect/listen, so call this right after creating the socket.
+    Options the platform lacks are skipped.
+    """
+    applied = {}
+    tcp = socket.IPPROTO_TCP
+
+    def apply(key, level, option, label, value=None):
+        if key in profile:
+            value = profile[key] if value is None else value
+            if _set(sock, level, option, value, label):
+                applied[key] = profile[key]
+
+    apply("sndbuf", socket.SOL_SOCKET, socket.SO_SNDBUF, "SO_SNDBUF")
+    apply("rcvbuf", socket.SOL_SOCKET, socket.SO_RCVBUF, "SO_RCVBUF")
+    nodelay = int(profile.get("nodelay", False))
+    apply("nodelay", tcp, socket.TCP_NODELAY, "TCP_NODELAY", nodelay)
+    apply("quickack", tcp, getattr(socket, "TCP_QUICKACK", None), "TCP_QUICKACK", 1)
+
+    if any(k in profile for k in ("keepidle", "keepintvl", "keepcnt")):
+        _set(sock, socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1, "SO_KEEPALIVE")
+        apply("keepidle", tcp, _TCP_KEEPIDLE, "TCP_KEEPIDLE")
+        keepintvl = getattr(socket, "TCP_KEEPINTVL", None)
+        apply("keepintvl", tcp, keepintvl, "TCP_KEEPINTVL")
+        apply("keepcnt", tcp, getattr(socket, "TCP_KEEPCNT", None), "TCP_KEEPCNT")
+
+    apply(
+        "user_timeout",
+        tcp,
+        getattr(socket, "TCP_USER_TIMEOUT", None),
+        "TCP_USER_TIMEOUT",
+    )
+    return applied
+
+
+def rearm_quickack(sock, profile):
+    """Re-enable TCP_QUICKACK after a receive; Linux clears it on its own."""
+    if profile.get("quickack") and hasattr(socket, "TCP_QUICKACK"):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def corked(sock, profile):
+    """Hold back partial segments while several writes are batched.
+
+    Uses TCP_CORK on Linux or TCP_NOPUSH on BSD/macOS when the profile asks
+    for it; otherwise this is a no-op.
+    """
+    option = getattr(socket, "TCP_CORK", getattr(socket, "TCP_NOPUSH", None))
+    cork = profile.get("cork") and option is not None
+    if cork:
+        _set(sock, socket.IPPROTO_TCP, option, 1, "TCP_CORK")
+    try:
+        yield sock
+    finally:
+        # Uncorking flushes whatever is still queued
+        if cork:
+            _set(sock, socket.IPPROTO_TCP, option, 0, "TCP_CORK")
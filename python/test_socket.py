@@ -5,6 +5,8 @@ import logging
 import sys
 import threading
 
+from socket_profiles import apply_profile, get_profile, rearm_quickack
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -12,15 +14,22 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_device_udid():
-    """Get the UDID of the connected iOS device."""
+def get_device_udid(udid=None):
+    """Get the UDID of the connected iOS device, or check the requested one."""
     try:
         result = subprocess.run(["idevice_id", "-l"], capture_output=True, text=True)
-        if result.stdout.strip():
-            return result.stdout.strip()
-        else:
+        udids = result.stdout.split()
+        if not udids:
             logging.error("No iOS device found")
             sys.exit(1)
+        if udid is not None:
+            if udid not in udids:
+                logging.error(f"Device {udid} not found")
+                sys.exit(1)
+            return udid
+        if len(udids) > 1:
+            logging.info(f"{len(udids)} devices found, using the first one")
+        return udids[0]
     except Exception as e:
         logging.error(f"Error getting device UDID: {e}")
         sys.exit(1)
@@ -33,8 +42,8 @@ def start_port_forwarding(device_id, local_port, device_port):
         subprocess.run(["pkill", "-f", "iproxy"], capture_output=True)
         time.sleep(1)  # Wait for process to be killed
 
-        # Start iproxy in the background
-        cmd = ["iproxy", str(local_port), str(device_port)]
+        # Start iproxy in the background, pinned to the chosen device
+        cmd = ["iproxy", str(local_port), str(device_port), device_id]
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         time.sleep(2)  # Wait for port forwarding to start
 
@@ -49,11 +58,12 @@ def start_port_forwarding(device_id, local_port, device_port):
         sys.exit(1)
 
 
-def receive_messages(sock):
+def receive_messages(sock, profile):
     """Continuously receive messages from the socket."""
     while True:
         try:
             data = sock.recv(1024)
+            rearm_quickack(sock, profile)
             if not data:
                 logging.info("Connection closed by the server")
                 break
@@ -79,14 +89,22 @@ def send_heartbeat(sock):
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python test_socket.py <port>")
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python test_socket.py <port> [socket_profile] [udid]")
         sys.exit(1)
 
     port = int(sys.argv[1])
+    socket_profile = sys.argv[2] if len(sys.argv) > 2 else "default"
+    udid = sys.argv[3] if len(sys.argv) > 3 else None
+    try:
+        profile = get_profile(socket_profile)
+    except ValueError as e:
+        print("Usage: python test_socket.py <port> [socket_profile] [udid]")
+        print(e)
+        sys.exit(1)
 
     # Get device UDID
-    device_id = get_device_udid()
+    device_id = get_device_udid(udid)
     logging.info(f"Found device: {device_id}")
 
     # Start port forwarding
@@ -96,6 +114,7 @@ def main():
         try:
             # Create socket
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            apply_profile(sock, profile)
             sock.settimeout(0.5)  # Short timeout for non-blocking receive
 
             # Connect to the port
@@ -104,7 +123,9 @@ def main():
             logging.info(f"✅ Successfully connected to port {port}")
 
             # Start threads for receiving and sending
-            receive_thread = threading.Thread(target=receive_messages, args=(sock,))
+            receive_thread = threading.Thread(
+                target=receive_messages, args=(sock, profile)
+            )
             heartbeat_thread = threading.Thread(target=send_heartbeat, args=(sock,))
             receive_thread.daemon = True
             heartbeat_thread.daemon = True